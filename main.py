@@ -1,7 +1,27 @@
-import graphlib
+import re
+import sys
+import weakref
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+try:
+    # Rust-backed drop-in replacement for the stdlib sorter; noticeably faster
+    # on large dependency graphs.
+    from graphlib2 import CycleError, TopologicalSorter
+except ImportError:
+    from graphlib import CycleError, TopologicalSorter
 from fastmcp import FastMCP, Context
-from pydantic import BaseModel
-from typing import List, Dict, Optional, Set, Union, Any, Callable, Tuple
+from typing import (
+    List,
+    Dict,
+    Iterable,
+    Optional,
+    Set,
+    Union,
+    Any,
+    Callable,
+    Tuple,
+)
 import argparse
 
 # --- MCP Parameter Description Monkey Patch ---
@@ -47,6 +67,12 @@ PARAM_DESCRIPTIONS = {
     },
 }
 
+# Flattened once so the patch below does a single lookup per registration
+# instead of re-deriving dict item views each call.
+_PARAM_DESC_ITEMS = {
+    name: list(descs.items()) for name, descs in PARAM_DESCRIPTIONS.items()
+}
+
 try:
     from fastmcp.tools.tool import ParsedFunction
 
@@ -58,14 +84,11 @@ try:
         parsed = _original_from_function(
             fn, exclude_args=exclude_args, validate=validate
         )
-        tool_name = getattr(fn, "__name__", None)
-        if tool_name in PARAM_DESCRIPTIONS:
-            param_descs = PARAM_DESCRIPTIONS[tool_name]
-            props = parsed.parameters.get("properties")
-            if props:
-                for param, desc in param_descs.items():
-                    if param in props:
-                        props[param]["description"] = desc
+        entries = _PARAM_DESC_ITEMS.get(getattr(fn, "__name__", None))
+        if entries is not None and (props := parsed.parameters.get("properties")):
+            for param, desc in entries:
+                if param in props:
+                    props[param]["description"] = desc
         return parsed
 
     ParsedFunction.from_function = staticmethod(patched_from_function)
@@ -76,39 +99,145 @@ except ImportError:
 # --- Data Structures ---
 
 
-class Goal(BaseModel):
+@dataclass(slots=True)
+class Goal:
     id: str
     description: str
-    steps: List[str] = []
+    # Insertion-ordered set of step ids: a dict keyed by step id gives O(1)
+    # membership and removal while preserving the user-visible step order.
+    steps: Dict[str, None] = field(default_factory=dict)
     completed: bool = False
 
 
 class ServerState:
     """A class to hold the server's in-memory state."""
 
+    __slots__ = (
+        "goals",
+        "dependents",
+        "incomplete",
+        "undefined",
+        "steps_closure",
+        "diagram_cache",
+        "plan_cache",
+        "topo_order",
+    )
+
     def __init__(self):
         self.goals: Dict[str, Goal] = {}
+        # Reverse adjacency map: step id -> ids of goals that list it as a step.
+        # Kept in sync with Goal.steps so dependent lookups don't have to scan
+        # every goal in the session.
+        self.dependents: Dict[str, Set[str]] = {}
+        # Membership index of incomplete goal ids, so prerequisite checks and
+        # assessments don't rescan every goal. Kept in sync with
+        # Goal.completed via set_completed; ordering is not meaningful
+        # (reopened goals land at the end), so first_incomplete walks the
+        # goals dict instead.
+        self.incomplete: Dict[str, None] = {}
+        # Ids of goals with empty descriptions ("need more definition"), so
+        # assess_goal and plan_for_goal don't re-strip every description on
+        # each call. Maintained whenever goals are (re)defined in set_goals.
+        self.undefined: Set[str] = set()
+        # Memoized transitive-step closures (goal id -> step id set), shared
+        # across tool calls via _get_all_steps. Cleared whenever any goal's
+        # steps change, since a single new edge can extend many closures.
+        self.steps_closure: Dict[str, Set[str]] = {}
+        # Rendered Mermaid diagrams keyed by queried goal id. The diagram
+        # text reflects both edges and completion labels, so it is cleared
+        # on any step change or completion flip.
+        self.diagram_cache: Dict[str, str] = {}
+        # Memoized plan_for_goal responses keyed by the full argument tuple,
+        # invalidated together with diagram_cache; agents tend to re-ask for
+        # the same plan several times between mutations.
+        self.plan_cache: Dict[
+            Tuple[str, Optional[int], bool], Dict[str, Union[List[str], str]]
+        ] = {}
+        # Lazily computed topological order of the whole session graph.
+        # Filtering this by a goal's closure yields that goal's plan order,
+        # so one sort is amortized across every plan query. Structural
+        # changes reset it to None; completion flips leave it valid.
+        self.topo_order: Optional[List[str]] = None
+
+    def link_step(self, goal_id: str, step_id: str):
+        """Records that `goal_id` lists `step_id` as one of its steps."""
+        self.dependents.setdefault(step_id, set()).add(goal_id)
+
+    def unlink_step(self, goal_id: str, step_id: str):
+        """Removes the reverse edge recorded by link_step, if present."""
+        dependents = self.dependents.get(step_id)
+        if dependents:
+            dependents.discard(goal_id)
+            if not dependents:
+                del self.dependents[step_id]
+
+    def set_completed(self, goal_id: str, completed: bool):
+        """Flips a goal's completed flag and updates the incomplete index."""
+        goal = self.goals.get(goal_id)
+        if goal is None:
+            return
+        goal.completed = completed
+        if completed:
+            self.incomplete.pop(goal_id, None)
+        else:
+            self.incomplete[goal_id] = None
+        self.diagram_cache.clear()
+        self.plan_cache.clear()
+
+    def first_incomplete(self) -> Optional[Goal]:
+        """Returns the first goal in definition order that is not yet
+        completed, if any. The incomplete index only tracks membership, so
+        walk the goals dict to keep suggestions stable when goals are
+        reopened."""
+        if not self.incomplete:
+            return None
+        for goal in self.goals.values():
+            if not goal.completed:
+                return goal
+        return None
 
     def reset(self):
         self.goals.clear()
+        self.dependents.clear()
+        self.incomplete.clear()
+        self.undefined.clear()
+        self.steps_closure.clear()
+        self.diagram_cache.clear()
+        self.plan_cache.clear()
+        self.topo_order = None
 
 
 class ConductorMCP(FastMCP):
     """A custom FastMCP subclass that will hold all session states."""
 
-    sessions: Dict[str, ServerState]
+    sessions: "OrderedDict[str, ServerState]"
+
 
+# Cap on retained sessions; the least-recently-used session is evicted once
+# this many distinct session ids have been seen, so long-running servers
+# under client churn don't grow memory without bound.
+MAX_SESSIONS = 1024
 
 # --- MCP Server Setup ---
 
 mcp = ConductorMCP("Conductor MCP")
-mcp.sessions = {}  # type: ignore
+mcp.sessions = OrderedDict()  # type: ignore
+
+# Fast-path memo from transport session object to its state, so repeat tool
+# calls skip the attribute chase and string-keyed lookup. Weak keys mean an
+# entry dies with its session object instead of pinning state forever.
+_states_by_session: "weakref.WeakKeyDictionary[Any, ServerState]" = (
+    weakref.WeakKeyDictionary()
+)
 
 # --- Session Management ---
 
+# Tree-drawing characters accepted (and ignored) in tree-format steps.
+_TREE_CHARS_RE = re.compile(r"[├└─│]")
+
 
 def _parse_dependency_tree(
-    tree_text: str, root_goal_id: str = None
+    tree_text: str, root_goal_id: Optional[str] = None
 ) -> Tuple[Dict[str, List[str]], Dict[str, str]]:
     """
     Parses a tree-like dependency hierarchy into a goal dependency map.
@@ -144,14 +273,11 @@ def _parse_dependency_tree(
         if not line.strip():
             continue
 
-        # Remove tree characters and calculate indentation
-        clean_line = line.replace("├──", "").replace("└──", "").replace("│", "").strip()
-
-        # Calculate indentation more flexibly - any amount of whitespace
-        original_clean = line
-        for char in ["├", "─", "└", "│"]:
-            original_clean = original_clean.replace(char, " ")
-        indent_level = len(original_clean) - len(original_clean.lstrip())
+        # Blank out tree-drawing characters in one pass; the space-padded form
+        # yields the indentation level and, stripped, the line content.
+        padded_line = _TREE_CHARS_RE.sub(" ", line)
+        indent_level = len(padded_line) - len(padded_line.lstrip())
+        clean_line = padded_line.strip()
 
         # Extract goal name and description from various formats
         goal_name = ""
@@ -205,16 +331,13 @@ def _parse_dependency_tree(
         if indent_level == 0:
             depth = 0
         else:
-            # Find appropriate depth based on existing stack
-            depth = 1
-            for i, stack_indent in enumerate(
-                [0] + [4 * (j + 1) for j in range(len(parent_stack))]
-            ):
-                if indent_level <= stack_indent:
+            # Find appropriate depth based on existing stack; level i of the
+            # stack corresponds to an indent of 4 * i spaces.
+            depth = len(parent_stack) + 1
+            for i in range(len(parent_stack) + 1):
+                if indent_level <= 4 * i:
                     depth = i
                     break
-            else:
-                depth = len(parent_stack) + 1
 
         # Adjust parent stack to match current depth
         parent_stack = parent_stack[:depth]
@@ -265,6 +388,16 @@ def get_session_state(ctx: Context) -> ServerState:
     session_key = None
     # Use the unique ID of the transport session object for automatic isolation.
     session_obj = getattr(ctx, "session", None)
+    if session_obj is not None:
+        try:
+            state = _states_by_session.get(session_obj)
+        except TypeError:
+            # Session objects that can't be weak-referenced or hashed just
+            # take the string-keyed path below.
+            session_obj = None
+        else:
+            if state is not None:
+                return state
     if session_obj and hasattr(session_obj, "id"):
         session_key = session_obj.id
 
@@ -272,10 +405,22 @@ def get_session_state(ctx: Context) -> ServerState:
     if not session_key:
         session_key = "default_session"
 
-    if session_key not in mcp_instance.sessions:
-        mcp_instance.sessions[session_key] = ServerState()
-
-    return mcp_instance.sessions[session_key]
+    sessions = mcp_instance.sessions
+    state = sessions.get(session_key)
+    if state is None:
+        # setdefault inserts atomically, so two interleaved first requests
+        # for the same session can't clobber each other's state; the miss
+        # path constructs at most one ServerState and the hit path none.
+        state = sessions.setdefault(session_key, ServerState())
+        if len(sessions) > MAX_SESSIONS:
+            sessions.popitem(last=False)
+    else:
+        sessions.move_to_end(session_key)
+    if session_obj is not None:
+        # A later LRU eviction from sessions doesn't invalidate this entry;
+        # the state simply lives as long as the session object does.
+        _states_by_session[session_obj] = state
+    return state
 
 
 # --- Tools ---
@@ -288,17 +433,27 @@ def _reset_state(ctx: Context) -> str:
     return "State has been reset."
 
 
-def _find_all_dependents(goal_id: str, all_goals: Dict[str, Goal]) -> Set[str]:
+def _cascade_incomplete(state: ServerState, goal_id: str) -> Set[str]:
     """
-    Recursively find all goals that depend on the given goal (directly or
-    transitively)."""
-    dependents = set()
-    for g in all_goals.values():
-        if goal_id in g.steps:
-            if g.id not in dependents:
-                dependents.add(g.id)
-                dependents.update(_find_all_dependents(g.id, all_goals))
-    return dependents
+    Marks `goal_id` and all its transitive dependents incomplete in a single
+    walk over the reverse adjacency, returning the ids that actually flipped.
+    """
+    affected: Set[str] = set()
+    goals = state.goals
+    dependents_map = state.dependents
+    visited = {goal_id}
+    stack = [goal_id]
+    while stack:
+        current_id = stack.pop()
+        goal = goals.get(current_id)
+        if goal is not None and goal.completed:
+            state.set_completed(current_id, False)
+            affected.add(current_id)
+        for dep_id in dependents_map.get(current_id, ()):
+            if dep_id not in visited:
+                visited.add(dep_id)
+                stack.append(dep_id)
+    return affected
 
 
 @mcp.tool()
@@ -334,118 +489,137 @@ def set_goals(ctx: Context, goals: List[Dict[str, Any]]) -> str:
         an actionable suggestion for what to do next.
     """
     state = get_session_state(ctx)
-
-    # First, process goals and handle tree-format steps
-    processed_goals = []
-    all_tree_goals = {}  # Store goals created from tree parsing
+    existing_goals = state.goals
+
+    # Process goals in a single pass, reading the fields we need into locals
+    # instead of copying the caller's dicts, and constructing each Goal
+    # directly. Tree- and step-created goals are collected separately and
+    # converted after the batch so later trees can still extend them. Ids are
+    # interned so the many dict keys, step lists, and set members referencing
+    # the same goal share one string.
+    all_tree_goals: Dict[str, Dict[str, Any]] = {}
+    batch_goal_ids = {goal["id"] for goal in goals if goal["id"]}
+    temp_goals: Dict[str, Goal] = {}
+    required_for_edges: List[Tuple[str, str]] = []
 
     for goal in goals:
-        processed_goal = goal.copy()
+        gid = sys.intern(goal["id"])
+        if not gid:
+            # Ignore entries with an empty id rather than creating a goal
+            # that can never be addressed.
+            continue
+        description = goal.get("description", "")
         steps = goal.get("steps", [])
 
         # Handle tree-format steps (string input)
         if isinstance(steps, str) and steps.strip():
             # Use the main goal's ID as the root goal ID
-            main_goal_id = processed_goal["id"]
-            tree_dependencies, tree_descriptions = _parse_dependency_tree(
-                steps, main_goal_id
-            )
+            tree_dependencies, tree_descriptions = _parse_dependency_tree(steps, gid)
+            steps = []
 
             # Create goals for all nodes in the tree, excluding the main goal
-            for goal_id, deps in tree_dependencies.items():
-                if goal_id == main_goal_id:
+            for tree_goal_id, deps in tree_dependencies.items():
+                if tree_goal_id == gid:
                     # This is the main goal - just set its steps
-                    processed_goal["steps"] = deps
+                    steps = deps
                     # If tree has a description for main goal and main goal has no
                     # description, use it
-                    if not processed_goal.get("description") and tree_descriptions.get(
-                        goal_id
-                    ):
-                        processed_goal["description"] = tree_descriptions[goal_id]
-                elif goal_id not in all_tree_goals:
-                    all_tree_goals[goal_id] = {
-                        "id": goal_id,
-                        "description": tree_descriptions.get(goal_id, ""),
-                        "steps": deps,
+                    if not description and tree_descriptions.get(tree_goal_id):
+                        description = tree_descriptions[tree_goal_id]
+                elif tree_goal_id not in all_tree_goals:
+                    all_tree_goals[tree_goal_id] = {
+                        "id": tree_goal_id,
+                        "description": tree_descriptions.get(tree_goal_id, ""),
+                        "steps": dict.fromkeys(deps),
                     }
                 else:
-                    # Merge dependencies if goal already exists
-                    existing_steps = set(all_tree_goals[goal_id]["steps"])
-                    existing_steps.update(deps)
-                    all_tree_goals[goal_id]["steps"] = list(existing_steps)
+                    # Merge dependencies if goal already exists; the ordered
+                    # dict dedupes while preserving first-seen order
+                    tree_goal = all_tree_goals[tree_goal_id]
+                    tree_goal["steps"].update(dict.fromkeys(deps))
                     # Update description if we have one from tree and none exists
-                    if not all_tree_goals[goal_id][
-                        "description"
-                    ] and tree_descriptions.get(goal_id):
-                        all_tree_goals[goal_id]["description"] = tree_descriptions[
-                            goal_id
-                        ]
+                    if not tree_goal["description"] and tree_descriptions.get(
+                        tree_goal_id
+                    ):
+                        tree_goal["description"] = tree_descriptions[tree_goal_id]
 
         # Handle list-format steps - now auto-create goals for consistency
         elif isinstance(steps, list):
             # Create goals for any step IDs that don't exist yet
-            existing_goal_ids = {g["id"] for g in goals}
             for step_id in steps:
                 if (
                     step_id not in all_tree_goals
-                    and step_id not in existing_goal_ids
-                    and step_id not in state.goals
+                    and step_id not in batch_goal_ids
+                    and step_id not in existing_goals
                 ):
                     all_tree_goals[step_id] = {
                         "id": step_id,
                         "description": "",
-                        "steps": [],
+                        "steps": {},
                     }
 
-        processed_goals.append(processed_goal)
-
-    # Add tree-generated goals to the processed goals list
-    processed_goals.extend(all_tree_goals.values())
-
-    # Create temporary goals dict
-    temp_goals = {
-        gid: Goal(
+        existing = existing_goals.get(gid)
+        temp_goals[gid] = Goal(
             id=gid,
-            description=goal.get("description", ""),
-            steps=goal.get("steps", []),
-            completed=(state.goals[gid].completed if gid in state.goals else False),
+            description=description,
+            steps=dict.fromkeys(sys.intern(s) for s in steps),
+            completed=existing.completed if existing is not None else False,
+        )
+        for target_goal_id in goal.get("required_for", ()):
+            required_for_edges.append((gid, sys.intern(target_goal_id)))
+
+    # Convert tree/step-created goals after the whole batch so their merged
+    # steps and descriptions are final; they come after the explicit goals,
+    # matching the previous processing order.
+    for tree_goal in all_tree_goals.values():
+        tgid = sys.intern(tree_goal["id"])
+        existing = existing_goals.get(tgid)
+        temp_goals[tgid] = Goal(
+            id=tgid,
+            description=tree_goal["description"],
+            steps=dict.fromkeys(sys.intern(s) for s in tree_goal["steps"]),
+            completed=existing.completed if existing is not None else False,
         )
-        for goal in processed_goals
-        if (gid := goal["id"])
-    }
-
-    # Then, handle required_for relationships in the temp dict
-    for goal in processed_goals:
-        goal_id = goal["id"]
-        required_for = goal.get("required_for", [])
-        for target_goal_id in required_for:
-            if target_goal_id in temp_goals:
-                if goal_id not in temp_goals[target_goal_id].steps:
-                    temp_goals[target_goal_id].steps.append(goal_id)
-            elif target_goal_id in state.goals:
-                if goal_id not in state.goals[target_goal_id].steps:
-                    state.goals[target_goal_id].steps.append(goal_id)
-            else:
-                temp_goals[target_goal_id] = Goal(
-                    id=target_goal_id, description="", steps=[goal_id], completed=False
-                )
-
-    # Build a combined graph of existing and new goals for cycle detection
-    combined_goals = {**state.goals, **temp_goals}
-
-    # Check for cycles in the combined graph
-    def get_neighbors(node_id: str) -> List[str]:
-        return combined_goals.get(node_id, Goal(id="", description="")).steps
 
-    # Get all nodes to check (temp_goals and their dependencies)
-    all_nodes_to_check = set(temp_goals.keys())
-    for goal in temp_goals.values():
-        all_nodes_to_check.update(goal.steps)
+    # Resolve required_for edges once the whole batch exists, so a target
+    # defined later in the same call is still found in temp_goals.
+    for goal_id, target_goal_id in required_for_edges:
+        if target_goal_id in temp_goals:
+            temp_goals[target_goal_id].steps[goal_id] = None
+        elif (target := existing_goals.get(target_goal_id)) is not None:
+            if goal_id not in target.steps:
+                target.steps[goal_id] = None
+                state.link_step(target_goal_id, goal_id)
+        else:
+            temp_goals[target_goal_id] = Goal(
+                id=target_goal_id,
+                description="",
+                steps={goal_id: None},
+                completed=False,
+            )
 
-    cycle_result = _has_cycle(all_nodes_to_check, get_neighbors)
-    if cycle_result:
-        # Find all nodes involved in cycles for error reporting
-        cycle_nodes = _find_cycle_nodes(all_nodes_to_check, get_neighbors)
+    # Step edges may have changed above (required_for on existing goals) or
+    # below (committing the batch), so drop the memoized closures and
+    # rendered diagrams now; neither is read later in this call.
+    state.steps_closure.clear()
+    state.diagram_cache.clear()
+    state.plan_cache.clear()
+    state.topo_order = None
+
+    # Check for cycles across the existing and new goals without copying the
+    # full goals dict; new goals shadow existing ones, matching the commit below.
+    def get_neighbors(node_id: str) -> Iterable[str]:
+        goal = temp_goals.get(node_id)
+        if goal is None:
+            goal = existing_goals.get(node_id)
+        return goal.steps if goal is not None else ()
+
+    # Any new cycle must pass through a goal in this batch (the committed
+    # graph is already acyclic and every new or changed edge touches one), so
+    # rooting the search at the batch's goals is sufficient. A single pass
+    # both detects cycles and collects the nodes involved for the error.
+    cycle_nodes = _find_cycle_nodes(temp_goals.keys(), get_neighbors)
+    if cycle_nodes:
         # Remove any goals involved in the cycle from temp_goals
         for node in cycle_nodes:
             temp_goals.pop(node, None)
@@ -456,17 +630,31 @@ def set_goals(ctx: Context, goals: List[Dict[str, Any]]) -> str:
             "again."
         )
 
-    # Commit temp_goals to state.goals
-    state.goals.update(temp_goals)
+    # Commit temp_goals to state.goals, keeping the reverse adjacency in sync
+    # for goals whose steps are being replaced.
+    for gid, goal in temp_goals.items():
+        old_goal = existing_goals.get(gid)
+        if old_goal is not None:
+            for step_id in old_goal.steps:
+                state.unlink_step(gid, step_id)
+        for step_id in goal.steps:
+            state.link_step(gid, step_id)
+    existing_goals.update(temp_goals)
+    for gid, goal in temp_goals.items():
+        if goal.completed:
+            state.incomplete.pop(gid, None)
+        else:
+            state.incomplete.setdefault(gid, None)
+        if goal.description.strip():
+            state.undefined.discard(gid)
+        else:
+            state.undefined.add(gid)
 
     # Build response with created goal information
     response_parts = ["Goals defined."]
 
     # Show information about auto-created goals from steps
-    original_goal_ids = {goal["id"] for goal in goals}
-    auto_created_goals = [
-        gid for gid in temp_goals.keys() if gid not in original_goal_ids
-    ]
+    auto_created_goals = [gid for gid in temp_goals.keys() if gid not in batch_goal_ids]
 
     if auto_created_goals:
         auto_created_count = len(auto_created_goals)
@@ -485,9 +673,8 @@ def set_goals(ctx: Context, goals: List[Dict[str, Any]]) -> str:
             )
 
     # Suggest the first incomplete goal to focus on
-    incomplete_goals = [g for g in state.goals.values() if not g.completed]
-    if incomplete_goals:
-        g = incomplete_goals[0]
+    g = state.first_incomplete()
+    if g:
         suggestion = (
             f"Next, you might want to focus on {g.id}: "
             f"{_format_description_with_period(g.description)} You can use "
@@ -522,62 +709,61 @@ def mark_goals(
         dependents, all are listed in the suggestion.
     """
     state = get_session_state(ctx)
+    goals = state.goals
+    # Session-wide memo; mark_goals only flips completion flags, so the
+    # closures stay valid across this call.
+    steps_cache = state.steps_closure
 
     def _mark_goal_complete_internal(goal_id: str):
-        if goal_id not in state.goals:
-            return
-        goal = state.goals[goal_id]
-        if goal.completed:
+        goal = goals.get(goal_id)
+        if goal is None or goal.completed:
             return
-        all_steps = _get_all_steps(goal_id, state.goals)
-        for p in all_steps:
-            if p in state.goals and not state.goals[p].completed:
-                _mark_goal_complete_internal(p)
-        state.goals[goal_id].completed = True
+        # Completing a goal completes its entire step closure, so one pass
+        # over the memoized closure replaces the old per-node recursion
+        # (which re-derived the same shared subtrees at every level).
+        for p in _get_all_steps(goal_id, goals, steps_cache):
+            step_goal = goals.get(p)
+            if step_goal is not None and not step_goal.completed:
+                state.set_completed(p, True)
+        state.set_completed(goal_id, True)
 
     results = []
     all_dependents = set()
 
     for goal_id in goal_ids:
-        if goal_id not in state.goals:
+        goal = goals.get(goal_id)
+        if goal is None:
             results.append(f"Goal '{goal_id}' not found.")
             continue
 
-        goal = state.goals.get(goal_id)
-        if goal and goal.completed == completed:
+        if goal.completed == completed:
             status = "completed" if completed else "incomplete"
             results.append(f"Goal '{goal_id}' was already {status}.")
             continue
 
         if completed:
-            all_steps = _get_all_steps(goal_id, state.goals)
-            incomplete_steps = [
-                p
-                for p in all_steps
-                if p in state.goals and not state.goals[p].completed
-            ]
-            if incomplete_steps and not complete_steps:
-                results.append(
-                    f"Goal '{goal_id}': You must complete all prerequisites before "
-                    "marking this goal as complete. "
-                    "Run plan_for_goal to see the required steps. "
-                    "To override, call mark_goals with complete_steps=True "
-                    "(this will mark all prerequisites as completed)."
-                )
-                continue
             if complete_steps:
                 _mark_goal_complete_internal(goal_id)
             else:
-                state.goals[goal_id].completed = True
+                all_steps = _get_all_steps(goal_id, goals, steps_cache)
+                if not all_steps.isdisjoint(state.incomplete):
+                    results.append(
+                        f"Goal '{goal_id}': You must complete all prerequisites "
+                        "before marking this goal as complete. "
+                        "Run plan_for_goal to see the required steps. "
+                        "To override, call mark_goals with complete_steps=True "
+                        "(this will mark all prerequisites as completed)."
+                    )
+                    continue
+                state.set_completed(goal_id, True)
         else:
-            state.goals[goal_id].completed = False
+            state.set_completed(goal_id, False)
 
         status = "completed" if completed else "marked as incomplete"
         results.append(f"Goal '{goal_id}' {status}.")
 
         # Collect dependents for final message
-        dependents = [g.id for g in state.goals.values() if goal_id in g.steps]
-        all_dependents.update(dependents)
+        all_dependents.update(state.dependents.get(goal_id, ()))
 
     result_message = "\n".join(results)
 
@@ -595,9 +781,8 @@ def mark_goals(
         return result_message + f"\n{suggestion}"
     else:
         # Suggest the next incomplete goal
-        incomplete_goals = [g for g in state.goals.values() if not g.completed]
-        if incomplete_goals:
-            g = incomplete_goals[0]
+        g = state.first_incomplete()
+        if g:
             suggestion = (
                 f"Next, you might want to focus on {g.id}: "
                 f"{_format_description_with_period(g.description)}"
@@ -622,18 +807,20 @@ def add_steps(ctx: Context, goal_steps: Dict[str, List[str]]) -> str:
         do next.
     """
     state = get_session_state(ctx)
+    goals = state.goals
     results = []
     all_affected = set()
 
     for goal_id, steps in goal_steps.items():
-        if goal_id not in state.goals:
+        goal = goals.get(goal_id)
+        if goal is None:
             results.append(f"Goal '{goal_id}' not found.")
             continue
 
-        goal = state.goals[goal_id]
         added_steps = []
 
         for step_id in steps:
+            step_id = sys.intern(step_id)
             if goal_id == step_id:
                 results.append(f"Goal '{goal_id}' cannot have itself as a step.")
                 continue
@@ -641,29 +828,28 @@ def add_steps(ctx: Context, goal_steps: Dict[str, List[str]]) -> str:
                 results.append(f"Step '{step_id}' already exists for goal '{goal_id}'.")
                 continue
 
-            new_steps = goal.steps + [step_id]
-            if _check_for_deadlocks(goal_id, new_steps, state.goals):
+            # The committed graph is a DAG, so none of the goal's existing
+            # steps can already reach it; only the new edge needs checking.
+            if _check_for_deadlocks(goal_id, step_id, goals, state.steps_closure):
                 results.append(
                     f"Adding step '{step_id}' to goal '{goal_id}' would create a "
                     "deadlock."
                 )
                 continue
 
-            goal.steps.append(step_id)
+            goal.steps[step_id] = None
+            state.link_step(goal_id, step_id)
+            # The new edge can extend any closure that reaches this goal, so
+            # drop the memoized step closures and rendered diagrams wholesale.
+            state.steps_closure.clear()
+            state.diagram_cache.clear()
+            state.plan_cache.clear()
+            state.topo_order = None
             added_steps.append(step_id)
 
         if added_steps:
             # Mark goal and all dependents as incomplete if they were complete
-            affected = set()
-            if goal.completed:
-                goal.completed = False
-                affected.add(goal_id)
-            dependents = _find_all_dependents(goal_id, state.goals)
-            for dep_id in dependents:
-                if state.goals[dep_id].completed:
-                    state.goals[dep_id].completed = False
-                    affected.add(dep_id)
-            all_affected.update(affected)
+            all_affected.update(_cascade_incomplete(state, goal_id))
 
             results.append(f"Added steps {', '.join(added_steps)} to goal '{goal_id}'.")
 
@@ -682,9 +868,8 @@ def add_steps(ctx: Context, goal_steps: Dict[str, List[str]]) -> str:
         result_message += f"\n{suggestion}"
     else:
         # Suggest the next incomplete goal
-        incomplete_goals = [g for g in state.goals.values() if not g.completed]
-        if incomplete_goals:
-            g = incomplete_goals[0]
+        g = state.first_incomplete()
+        if g:
             suggestion = (
                 f"Next, you might want to focus on {g.id}: "
                 f"{_format_description_with_period(g.description)} Use "
@@ -697,41 +882,88 @@ def add_steps(ctx: Context, goal_steps: Dict[str, List[str]]) -> str:
 
 
 def _check_for_deadlocks(
-    goal_id: str, steps: List[str], all_goals: Dict[str, Goal]
+    goal_id: str,
+    step_id: str,
+    all_goals: Dict[str, Goal],
+    cache: Optional[Dict[str, Set[str]]] = None,
 ) -> bool:
-    """Checks if adding a step would create a deadlock."""
+    """
+    Checks if making `step_id` a step of `goal_id` would create a deadlock.
 
-    def get_neighbors(node_id: str) -> List[str]:
-        if node_id == goal_id:
-            return steps
-        return all_goals.get(node_id, Goal(id="", description="")).steps
+    The existing graph is always acyclic, so the only possible cycle is one
+    that leads back to `goal_id` itself — i.e. `goal_id` already appears in
+    `step_id`'s transitive closure. With the session's memoized closure cache
+    this is a single set lookup on repeat checks.
+    """
+    return goal_id == step_id or goal_id in _get_all_steps(step_id, all_goals, cache)
 
-    return _has_cycle({goal_id}, get_neighbors)
 
+def _get_all_steps(
+    goal_id: str,
+    all_goals: Dict[str, Goal],
+    cache: Optional[Dict[str, Set[str]]] = None,
+) -> Set[str]:
+    """
+    Fetches all transitive steps for a given goal, iteratively.
 
-def _get_all_steps(goal_id: str, all_goals: Dict[str, Goal]) -> Set[str]:
-    """Recursively fetches all steps for a given goal."""
+    An optional cache (goal id -> step set) lets callers that look up many
+    overlapping goals in one request, like mark_goals, skip recomputation.
+    The cache is only valid while Goal.steps is unchanged.
+    """
+    if cache is not None:
+        cached = cache.get(goal_id)
+        if cached is not None:
+            return cached
     steps = set()
-    visited = set()
-
-    def _get_steps_recursive(current_id: str):
-        if current_id in visited:
-            return  # Prevent infinite recursion
-        visited.add(current_id)
-
-        current_goal = all_goals.get(current_id)
+    stack = [goal_id]
+    while stack:
+        current_goal = all_goals.get(stack.pop())
         if not current_goal:
-            return
-
+            continue
         for step_id in current_goal.steps:
             if step_id not in steps:
                 steps.add(step_id)
-                _get_steps_recursive(step_id)
-
-    _get_steps_recursive(goal_id)
+                stack.append(step_id)
+    if cache is not None:
+        cache[goal_id] = steps
     return steps
 
 
+# Plan-entry and suggestion templates, pre-bound so the hot paths only call
+# format() instead of re-evaluating multi-line f-strings.
+_PLAN_COMPLETE_GOAL = "Complete goal: '{}' - {}".format
+_PLAN_UNDEFINED_GOAL = (
+    "Define and complete goal: '{}' - Details to be determined."
+).format
+_PLAN_UNKNOWN_GOAL = "Complete goal: '{}' - Details to be determined.".format
+_PLAN_FOCUS_SUGGESTION = (
+    "Next, you might want to focus on {}: {}. Once you've made progress, you "
+    "can call mark_goals. Call add_steps or set_goals if you discover "
+    "additional requirements."
+).format
+_ASSESS_NOT_FOUND = (
+    "Goal '{}' not found. You may want to define this goal first using set_goals."
+).format
+_ASSESS_UNDEFINED = (
+    "The goal has step goals that need more definition: {0}. "
+    "We don't know what's involved with {0}. "
+    "Maybe you could look into defining those as goals using set_goals."
+).format
+_ASSESS_READY = (
+    "All step goals are met. The goal is ready: {}\nWhen the goal is complete, "
+    "you can mark it as complete using mark_goals."
+).format
+_ASSESS_PROGRESS = (
+    "The goal is well-defined, but some step goals are incomplete. "
+    "Completion: {completed}/{total} ({percentage:.0f}%) goals completed. "
+    "Incomplete step goals: {incomplete}.\n{suggestion}"
+).format
+_ASSESS_FOCUS_SUGGESTION = (
+    "You might want to focus on completing the step goal: {}. Use "
+    "plan_for_goal to see the required steps, or mark completed steps as done."
+).format
+
+
 @mcp.tool()
 def plan_for_goal(
     ctx: Context,
@@ -766,7 +998,9 @@ def plan_for_goal(
         users to expand their definitions using set_goals.
     """
     state = get_session_state(ctx)
-    if goal_id not in state.goals:
+    goals = state.goals
+    goal = goals.get(goal_id)
+    if goal is None:
         return {
             "plan": [
                 f"Goal '{goal_id}' not found. You may want to define this goal first "
@@ -774,7 +1008,6 @@ def plan_for_goal(
             ],
             "diagram": "",
         }
-    goal = state.goals[goal_id]
     if goal.completed:
         return {
             "plan": [
@@ -784,115 +1017,132 @@ def plan_for_goal(
             "diagram": "",
         }
 
-    nodes = set()
-    queue = [goal_id]
-    visited = set()
-    while queue:
-        current_id = queue.pop(0)
-        if current_id in visited:
-            continue
-        visited.add(current_id)
-        nodes.add(current_id)
-        if current_id in state.goals:
-            for step in state.goals[current_id].steps:
-                queue.append(step)
-
-    graph = {}
-    for node_id in nodes:
-        if node_id in state.goals:
-            graph[node_id] = state.goals[node_id].steps
-        else:
-            graph[node_id] = []
-
-    try:
-        ts = graphlib.TopologicalSorter(graph)
-        sorted_goals = list(ts.static_order())
-    except graphlib.CycleError:
-        return {
-            "plan": [
-                "Error: A deadlock was detected in the goal dependencies. Please "
-                "review your goals and steps."
-            ],
-            "diagram": "",
-        }
+    cache_key = (goal_id, max_steps, include_diagram)
+    cached = state.plan_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    goals_get = goals.get
+    nodes = _get_all_steps(goal_id, goals, state.steps_closure) | {goal_id}
+
+    # One topological sort of the whole session graph is cached and filtered
+    # per query; a subsequence of a valid topological order is itself a valid
+    # order for the induced subgraph.
+    order = state.topo_order
+    if order is None:
+        try:
+            order = list(
+                TopologicalSorter(
+                    {gid: g.steps for gid, g in goals.items()}
+                ).static_order()
+            )
+        except CycleError:
+            return {
+                "plan": [
+                    "Error: A deadlock was detected in the goal dependencies. Please "
+                    "review your goals and steps."
+                ],
+                "diagram": "",
+            }
+        state.topo_order = order
+
+    if max_steps is not None and not include_diagram:
+        # Nothing downstream needs the full order, so stop filtering as soon
+        # as the step budget is filled.
+        sorted_goals = []
+        eligible = 0
+        for g_id in order:
+            if g_id not in nodes:
+                continue
+            sorted_goals.append(g_id)
+            g = goals_get(g_id)
+            if g is None or not g.completed:
+                eligible += 1
+                if eligible >= max_steps:
+                    break
+    else:
+        sorted_goals = [g_id for g_id in order if g_id in nodes]
 
+    # Plan entries are kept as (kind, goal id, description) tuples until the
+    # return site, so the suggestion logic below reads the fields directly
+    # instead of re-parsing the formatted strings.
     steps = []
+    append_step = steps.append
     for g_id in sorted_goals:
-        g = state.goals.get(g_id)
+        g = goals_get(g_id)
         if not g:
             # This shouldn't happen now since we auto-create goals, but handle
             # gracefully
-            steps.append(f"Complete goal: '{g_id}' - Details to be determined.")
+            append_step(("unknown", g_id, ""))
         elif not g.completed:
-            if g.description.strip():
-                steps.append(f"Complete goal: '{g_id}' - {g.description}")
+            if g_id not in state.undefined:
+                append_step(("complete", g_id, g.description))
             else:
-                steps.append(
-                    f"Define and complete goal: '{g_id}' - Details to be determined."
-                )
+                append_step(("define", g_id, ""))
 
     diagram = ""
     if include_diagram:
-        diagram = "graph TD\n"
-        for node_id in nodes:
-            g = state.goals.get(node_id)
-            if g:
-                if g.completed:
-                    diagram += (
-                        f'    {node_id}["{node_id}: {g.description} <br/> '
-                        '(Completed)"]\n'
-                    )
+        diagram = state.diagram_cache.get(goal_id, "")
+        if not diagram:
+            # Collect lines and join once; repeated += on a growing string is
+            # quadratic in the number of diagram lines.
+            parts = ["graph TD"]
+            append_part = parts.append
+            for node_id in nodes:
+                g = goals_get(node_id)
+                if g:
+                    if g.completed:
+                        append_part(
+                            f'    {node_id}["{node_id}: {g.description} <br/> '
+                            '(Completed)"]'
+                        )
+                    else:
+                        append_part(f'    {node_id}["{node_id}: {g.description}"]')
+                    parts.extend(f"    {step} --> {node_id}" for step in g.steps)
                 else:
-                    diagram += f'    {node_id}["{node_id}: {g.description}"]\n'
-            else:
-                diagram += f'    {node_id}["{node_id} (undefined)"]\n'
-
-            if node_id in state.goals:
-                for step in state.goals[node_id].steps:
-                    diagram += f"    {step} --> {node_id}\n"
+                    append_part(f'    {node_id}["{node_id} (undefined)"]')
+            diagram = "\n".join(parts) + "\n"
+            state.diagram_cache[goal_id] = diagram
 
     if max_steps is not None:
         steps = steps[:max_steps]
 
     if steps:
-        first_action = steps[0]
-        if "Define and complete goal" in first_action:
+        if steps[0][0] == "define":
             suggestion = (
                 "We don't know what's involved with one or more steps. Maybe you could "
                 "look into defining those as goals using set_goals."
             )
-        elif "Complete goal" in first_action:
+        else:
             next_goal = None
             next_desc = None
-            for s in steps:
-                if s.startswith("Complete goal: "):
-                    next_goal = s.split("'")[1]
-                    # Try to get the description from the string
-                    parts = s.split("- ")
-                    if len(parts) > 1:
-                        next_desc = parts[1]
+            for kind, g_id, desc in steps:
+                if kind == "complete":
+                    next_goal, next_desc = g_id, desc
+                    break
+                if kind == "unknown":
+                    next_goal, next_desc = g_id, "Details to be determined."
                     break
             if next_goal:
-                suggestion = (
-                    f"Next, you might want to focus on {next_goal}: {next_desc}. Once "
-                    "you've made progress, you can call mark_goals. Call add_steps or "
-                    "set_goals if you discover additional requirements."
-                )
+                suggestion = _PLAN_FOCUS_SUGGESTION(next_goal, next_desc)
             else:
                 suggestion = "All goals are complete."
-        elif "Error" in first_action:
-            suggestion = (
-                "There is a deadlock in your goal dependencies. Please review your "
-                "goals and steps."
-            )
-        else:
-            suggestion = (
-                "All steps are complete. Consider reviewing or adding new goals."
-            )
     else:
         suggestion = "All steps are complete. Consider reviewing or adding new goals."
 
-    return {"plan": steps + ([suggestion] if suggestion else []), "diagram": diagram}
+    plan = [
+        _PLAN_COMPLETE_GOAL(g_id, desc)
+        if kind == "complete"
+        else _PLAN_UNDEFINED_GOAL(g_id)
+        if kind == "define"
+        else _PLAN_UNKNOWN_GOAL(g_id)
+        for kind, g_id, desc in steps
+    ]
+    if suggestion:
+        plan.append(suggestion)
+    response: Dict[str, Union[List[str], str]] = {"plan": plan, "diagram": diagram}
+    state.plan_cache[cache_key] = response
+    return response
 
 
 @mcp.tool()
@@ -919,69 +1169,76 @@ def assess_goal(ctx: Context, goal_id: str) -> str:
         define steps, focus on specific incomplete steps, etc.).
     """
     state = get_session_state(ctx)
-    if goal_id not in state.goals:
-        return (
-            f"Goal '{goal_id}' not found. You may want to define this goal first using "
-            "set_goals."
-        )
-    goal = state.goals[goal_id]
+    goal = state.goals.get(goal_id)
+    if goal is None:
+        return _ASSESS_NOT_FOUND(goal_id)
     if goal.completed:
         return (
             "The goal is complete. You can choose another goal to work on or review "
             "completed work."
         )
-    all_steps = _get_all_steps(goal_id, state.goals)
+    all_steps = _get_all_steps(goal_id, state.goals, state.steps_closure)
     # Check if any step goals have empty descriptions (need more definition)
-    empty_desc_steps = sorted(
-        [
-            p
-            for p in all_steps
-            if p in state.goals and not state.goals[p].description.strip()
-        ]
-    )
+    empty_desc_steps = sorted(all_steps & state.undefined)
     if empty_desc_steps:
-        missing = ", ".join(empty_desc_steps)
-        return (
-            f"The goal has step goals that need more definition: {missing}. "
-            f"We don't know what's involved with {missing}. "
-            "Maybe you could look into defining those as goals using set_goals."
-        )
-    all_goals_in_workflow = all_steps.union({goal_id})
-    incomplete_steps = sorted(
-        [g for g in all_steps if g in state.goals and not state.goals[g].completed]
-    )
+        return _ASSESS_UNDEFINED(", ".join(empty_desc_steps))
+    incomplete_steps = sorted(all_steps & state.incomplete.keys())
     if not incomplete_steps:
-        return (
-            f"All step goals are met. The goal is ready: {goal.description}\nWhen the "
-            "goal is complete, you can mark it as complete using mark_goals."
-        )
-    completed_count = len(all_goals_in_workflow) - len(incomplete_steps) - 1
-    total_count = len(all_goals_in_workflow)
+        return _ASSESS_READY(goal.description)
+    # The graph is acyclic, so goal_id is never in its own closure; counting
+    # it directly avoids copying the (cached) step set just to take its size.
+    total_count = len(all_steps) + 1
+    completed_count = total_count - len(incomplete_steps) - 1
     percentage = (completed_count / total_count) * 100
-    if incomplete_steps:
-        suggestion = (
-            f"You might want to focus on completing the step goal: "
-            f"{incomplete_steps[0]}. Use plan_for_goal to see the required steps, or "
-            "mark completed steps as done."
-        )
-    else:
-        suggestion = "All step goals are complete."
-    return (
-        f"The goal is well-defined, but some step goals are incomplete. "
-        f"Completion: {completed_count}/{total_count} ({percentage:.0f}%) goals "
-        f"completed. Incomplete step goals: {', '.join(incomplete_steps)}.\n"
-        f"{suggestion}"
+    suggestion = _ASSESS_FOCUS_SUGGESTION(incomplete_steps[0])
+    return _ASSESS_PROGRESS(
+        completed=completed_count,
+        total=total_count,
+        percentage=percentage,
+        incomplete=", ".join(incomplete_steps),
+        suggestion=suggestion,
     )
 
 
 # --- Graph Traversal Utilities ---
 
 
+def _build_adjacency(
+    start_nodes: Iterable[str], get_neighbors: Callable[[str], Iterable[str]]
+) -> Tuple[Dict[str, List[str]], Dict[str, int]]:
+    """
+    Materializes the subgraph reachable from start_nodes in one BFS pass,
+    returning successor lists and in-degree counts for Kahn's algorithm.
+    """
+    succ: Dict[str, List[str]] = {}
+    indeg: Dict[str, int] = {}
+    queue = deque()
+    for start_id in start_nodes:
+        if start_id not in succ:
+            succ[start_id] = []
+            indeg[start_id] = 0
+            queue.append(start_id)
+    while queue:
+        node_id = queue.popleft()
+        neighbors = list(get_neighbors(node_id) or ())
+        succ[node_id] = neighbors
+        for neighbor in neighbors:
+            indeg[neighbor] = indeg.get(neighbor, 0) + 1
+            if neighbor not in succ:
+                succ[neighbor] = []
+                queue.append(neighbor)
+    return succ, indeg
+
+
 def _has_cycle(
-    start_nodes: Set[str], get_neighbors: Callable[[str], List[str]]
+    start_nodes: Iterable[str], get_neighbors: Callable[[str], Iterable[str]]
 ) -> bool:
     """
-    Generic DFS cycle detection that returns a boolean.
+    Generic cycle detection that returns a boolean.
+
+    Delegates the sort to TopologicalSorter (the graphlib2 backend when
+    available) over the materialized reachable subgraph; edge direction is
+    irrelevant for cycle existence.
 
     Args:
         start_nodes: Set of node IDs to start traversal from
@@ -990,36 +1247,25 @@ def _has_cycle(
     Returns:
         True if cycle exists, False otherwise
     """
-    visited = set()
-    stack = set()
-
-    def visit(node_id):
-        if node_id in stack:
-            return True
-        if node_id in visited:
-            return False
-        visited.add(node_id)
-        stack.add(node_id)
-
-        for neighbor in get_neighbors(node_id):
-            if visit(neighbor):
-                return True
-
-        stack.remove(node_id)
-        return False
-
-    for node_id in start_nodes:
-        if visit(node_id):
-            return True
-
+    succ, _ = _build_adjacency(start_nodes, get_neighbors)
+    try:
+        TopologicalSorter(succ).prepare()
+    except CycleError:
+        return True
     return False
 
 
 def _find_cycle_nodes(
-    start_nodes: Set[str], get_neighbors: Callable[[str], List[str]]
+    start_nodes: Iterable[str], get_neighbors: Callable[[str], Iterable[str]]
 ) -> Set[str]:
     """
-    Generic DFS cycle detection that returns nodes involved in cycles.
+    Generic cycle detection that returns nodes involved in cycles.
+
+    Keeps a hand-rolled Kahn drain rather than TopologicalSorter because
+    CycleError reports only a single cycle, while set_goals needs every node
+    stuck on one. The forward drain leaves the cycle members plus anything
+    downstream of a cycle, so a second drain against the reversed edges of
+    that leftover prunes it to the nodes a cycle actually passes through.
 
     Args:
         start_nodes: Set of node IDs to start traversal from
@@ -1028,31 +1274,33 @@ def _find_cycle_nodes(
     Returns:
         Set of node IDs involved in cycles
     """
-    visited = set()
-    stack = set()
-    cycle_nodes = set()
-
-    def visit(node_id):
-        if node_id in stack:
-            cycle_nodes.add(node_id)
-            return True
-        if node_id in visited:
-            return False
-        visited.add(node_id)
-        stack.add(node_id)
-
-        for neighbor in get_neighbors(node_id):
-            if visit(neighbor):
-                cycle_nodes.add(node_id)
-                return True
-
-        stack.remove(node_id)
-        return False
-
-    for node_id in start_nodes:
-        visit(node_id)
-
-    return cycle_nodes
+    succ, indeg = _build_adjacency(start_nodes, get_neighbors)
+    ready = deque(node_id for node_id, degree in indeg.items() if degree == 0)
+    while ready:
+        node_id = ready.popleft()
+        for neighbor in succ[node_id]:
+            indeg[neighbor] -= 1
+            if indeg[neighbor] == 0:
+                ready.append(neighbor)
+    leftover = {node_id for node_id, degree in indeg.items() if degree > 0}
+    # Drain the leftover subgraph from its sinks: nodes that are merely
+    # downstream of a cycle fall away, while cycle members keep a successor
+    # within the leftover and survive.
+    outdeg = {node_id: 0 for node_id in leftover}
+    preds: Dict[str, List[str]] = {node_id: [] for node_id in leftover}
+    for node_id in leftover:
+        for neighbor in succ[node_id]:
+            if neighbor in leftover:
+                outdeg[node_id] += 1
+                preds[neighbor].append(node_id)
+    ready = deque(node_id for node_id, degree in outdeg.items() if degree == 0)
+    while ready:
+        node_id = ready.popleft()
+        for pred in preds[node_id]:
+            outdeg[pred] -= 1
+            if outdeg[pred] == 0:
+                ready.append(pred)
+    return {node_id for node_id, degree in outdeg.items() if degree > 0}
 
 
 if __name__ == "__main__":
@@ -241,6 +241,59 @@ async def test_plan_for_goal_max_steps(client: Client) -> None:
     ), f"Plan suggestion not actionable: {steps[-1]}"
 
 
+@pytest.mark.asyncio
+async def test_plan_for_goal_cache_invalidated_by_mark_goals(client: Client) -> None:
+    """Tests that cached plans and diagrams reflect completions made after
+    they were first computed."""
+    await client.call_tool(
+        "set_goals", {"goals": [{"id": "goal1", "description": "Goal 1"}]}
+    )
+    await client.call_tool(
+        "set_goals",
+        {"goals": [{"id": "goal2", "description": "Goal 2", "steps": ["goal1"]}]},
+    )
+
+    # Prime the plan and diagram caches.
+    result = await client.call_tool("plan_for_goal", {"goal_id": "goal2"})
+    data = json.loads(result[0].text)  # type: ignore
+    assert "Complete goal: 'goal1' - Goal 1" in data["plan"]
+    assert 'goal1["goal1: Goal 1"]' in data["diagram"]
+
+    await client.call_tool("mark_goals", {"goal_ids": ["goal1"]})
+
+    # The same query must not serve the stale cached plan or diagram.
+    result = await client.call_tool("plan_for_goal", {"goal_id": "goal2"})
+    data = json.loads(result[0].text)  # type: ignore
+    assert "Complete goal: 'goal1' - Goal 1" not in data["plan"]
+    assert "Complete goal: 'goal2' - Goal 2" in data["plan"]
+    assert 'goal1["goal1: Goal 1 <br/> (Completed)"]' in data["diagram"]
+
+
+@pytest.mark.asyncio
+async def test_plan_for_goal_cache_invalidated_by_set_goals(client: Client) -> None:
+    """Tests that cached plans are refreshed when a step goal is redefined."""
+    await client.call_tool(
+        "set_goals",
+        {"goals": [{"id": "top_goal", "description": "Top", "steps": ["step1"]}]},
+    )
+
+    result = await client.call_tool("plan_for_goal", {"goal_id": "top_goal"})
+    data = json.loads(result[0].text)  # type: ignore
+    assert (
+        "Define and complete goal: 'step1' - Details to be determined." in data["plan"]
+    )
+
+    # Redefining the auto-created step must invalidate the cached plan.
+    await client.call_tool(
+        "set_goals", {"goals": [{"id": "step1", "description": "Step 1"}]}
+    )
+    result = await client.call_tool("plan_for_goal", {"goal_id": "top_goal"})
+    data = json.loads(result[0].text)  # type: ignore
+    assert "Complete goal: 'step1' - Step 1" in data["plan"]
+    assert not any("Define and complete goal" in step for step in data["plan"])
+    assert 'step1["step1: Step 1"]' in data["diagram"]
+
+
 @pytest.mark.asyncio
 async def test_plan_for_goal_missing_definition(client: Client) -> None:
     """
@@ -947,6 +1000,39 @@ async def test_get_session_state_with_id(client: Client) -> None:
         assert result1 is not result2
 
 
+@pytest.mark.asyncio
+async def test_get_session_state_lru_eviction(client: Client, monkeypatch) -> None:
+    """Tests that the oldest session is evicted once MAX_SESSIONS is exceeded
+    while recently used sessions survive."""
+
+    class MockSession:
+        def __init__(self, session_id):
+            self.id = session_id
+
+    class MockContext:
+        def __init__(self, session_id):
+            self.session = MockSession(session_id)
+            self.fastmcp = main.mcp
+
+    monkeypatch.setattr(main, "MAX_SESSIONS", 2)
+    main.mcp.sessions.clear()
+
+    # Fresh context objects per call keep lookups on the string-keyed LRU
+    # rather than the per-session-object fast path.
+    state_a = main.get_session_state(MockContext("session_a"))
+    state_b = main.get_session_state(MockContext("session_b"))
+    # Touch session_a so session_b becomes the least recently used entry.
+    main.get_session_state(MockContext("session_a"))
+    main.get_session_state(MockContext("session_c"))
+
+    assert "session_b" not in main.mcp.sessions
+    assert "session_a" in main.mcp.sessions
+    assert "session_c" in main.mcp.sessions
+    # The surviving session keeps its state; the evicted one starts over.
+    assert main.get_session_state(MockContext("session_a")) is state_a
+    assert main.get_session_state(MockContext("session_b")) is not state_b
+
+
 @pytest.mark.asyncio
 async def test_set_goals_many_auto_created(client: Client) -> None:
     """Tests the suggestion when more than 5 goals are auto-created."""
@@ -1065,6 +1151,15 @@ async def test_find_cycle_nodes() -> None:
     assert "b" in cycle_nodes
 
 
+@pytest.mark.asyncio
+async def test_find_cycle_nodes_excludes_descendants() -> None:
+    """Tests that _find_cycle_nodes only reports cycle members, not nodes
+    merely reachable from a cycle."""
+    graph = {"a": ["b"], "b": ["a", "c"], "c": []}
+    cycle_nodes = main._find_cycle_nodes(set(graph.keys()), graph.get)
+    assert cycle_nodes == {"a", "b"}
+
+
 @pytest.mark.asyncio
 async def test_parse_dependency_tree_edge_cases() -> None:
     """Tests _parse_dependency_tree with edge cases like empty lines and names."""